@@ -5,17 +5,68 @@ Downloads company and product data from Barnivore API and stores in SQLite datab
 """
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import shelve
 import sqlite3
 import json
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import logging
 from typing import Dict, List, Optional
 
+# orjson is a C-extension JSON parser, 2-5x faster than stdlib json on
+# typical API payloads; fall back to stdlib when it isn't installed.
+# Unlike response.json(), neither parser raises a RequestException on a
+# malformed body, so decode errors must be caught alongside it.
+try:
+    import orjson
+    _json_loads = orjson.loads
+    _JSONDecodeError = orjson.JSONDecodeError
+except ImportError:
+    _json_loads = json.loads
+    _JSONDecodeError = json.JSONDecodeError
+
+# ijson lets the large beer/wine/liquor list endpoints be parsed
+# incrementally off the wire instead of materializing the whole payload;
+# optional, like orjson above.
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+class TokenBucket:
+    """Thread-safe token-bucket rate limiter"""
+
+    def __init__(self, rate: float, burst: int = 5):
+        """Cap sustained throughput at `rate` requests/second while
+        allowing bursts of up to `burst` requests"""
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then consume it"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst,
+                                   self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
 class BarnivoreAPI:
     """Handle API requests to Barnivore"""
     
@@ -26,236 +77,348 @@ class BarnivoreAPI:
         'liquor': f"{BASE_URL}/liquor.json"
     }
     COMPANY_ENDPOINT = f"{BASE_URL}/company"
-    
-    def __init__(self, delay: float = 1.0):
+    # How long cached company responses stay valid
+    CACHE_TTL = 7 * 24 * 3600  # 7 days
+    # Connection pool size; must stay >= BarnivoreScraper.MAX_WORKERS or
+    # connections get evicted and re-handshaked under concurrency
+    POOL_SIZE = 32
+
+    def __init__(self, delay: float = 1.0, cache_path: str = "barnivore_http_cache"):
         """Initialize with optional delay between requests"""
         self.delay = delay
+        # One bucket shared by all worker threads: sustained rate stays at
+        # 1/delay requests/second overall, but idle capacity can be spent
+        # as a burst instead of every request waiting out a fixed sleep.
+        self.limiter = TokenBucket(rate=1.0 / delay) if delay > 0 else None
         self.session = requests.Session()
         self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+            # requests sends this by default, but make the compression of
+            # the large JSON list payloads explicit
+            'Accept-Encoding': 'gzip, deflate'
         })
+        # Retry transient failures (429s and 5xx) with exponential backoff
+        # instead of silently dropping the company, which otherwise costs a
+        # full re-scrape to recover.
+        retry = Retry(total=5, backoff_factor=0.5,
+                      status_forcelist=[429, 500, 502, 503, 504])
+        # Pool sized for the worker threads so keep-alive connections are
+        # reused rather than evicted and re-handshaked
+        adapter = HTTPAdapter(max_retries=retry,
+                              pool_connections=self.POOL_SIZE,
+                              pool_maxsize=self.POOL_SIZE,
+                              pool_block=False)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        # On-disk cache of parsed company responses keyed by URL, so
+        # re-runs skip the HTTP round-trip, the rate-limit delay and the
+        # JSON decode for anything fetched within CACHE_TTL.
+        self._cache = shelve.open(cache_path)
+        self._cache_lock = threading.Lock()
+
+    def close(self):
+        """Flush and close the response cache"""
+        self._cache.close()
     
     def get_companies_list(self) -> List[Dict]:
         """Fetch the main list of companies from all endpoints"""
         logger.info("Fetching companies list from all API endpoints...")
-        all_companies = []
-        
+        # Deduped on company ID as entries stream in; later entries win
+        unique_companies = {}
+
         for endpoint_name, endpoint_url in self.ENDPOINTS.items():
             try:
                 logger.info(f"Fetching from {endpoint_name} endpoint...")
-                response = self.session.get(endpoint_url, timeout=30)
+                seen_before = len(unique_companies)
+                response = self.session.get(endpoint_url, timeout=30, stream=True)
                 response.raise_for_status()
-                data = response.json()
-                companies = [item['company'] for item in data if 'company' in item]
-                logger.info(f"Retrieved {len(companies)} companies from {endpoint_name}")
-                all_companies.extend(companies)
-            except requests.RequestException as e:
+                if ijson is not None:
+                    # Parse companies incrementally off the socket; only the
+                    # deduped dict is ever held, not the raw payload
+                    response.raw.decode_content = True
+                    companies = ijson.items(response.raw, 'item.company')
+                else:
+                    data = _json_loads(response.content)
+                    companies = (item['company'] for item in data if 'company' in item)
+                for company in companies:
+                    if 'id' in company:
+                        unique_companies[company['id']] = company
+                logger.info(f"Retrieved {len(unique_companies) - seen_before} "
+                            f"new companies from {endpoint_name}")
+            except Exception as e:
+                # Broad by design: iterating the stream can raise ijson
+                # parse errors or urllib3 read errors in addition to
+                # RequestException/_JSONDecodeError, and one bad endpoint
+                # should not stop the remaining endpoints
                 logger.error(f"Failed to fetch companies from {endpoint_name}: {e}")
                 continue
-        
-        # Remove duplicates based on company ID
-        seen_ids = set()
-        unique_companies = []
-        for company in all_companies:
-            if company.get('id') not in seen_ids:
-                seen_ids.add(company.get('id'))
-                unique_companies.append(company)
-        
+
         logger.info(f"Total unique companies retrieved: {len(unique_companies)}")
-        return unique_companies
+        return list(unique_companies.values())
     
-    def get_company_details(self, company_id: int) -> Optional[Dict]:
-        """Fetch detailed company information including products"""
+    def get_company_details(self, company_id: int,
+                            refresh: bool = False) -> Optional[Dict]:
+        """Fetch detailed company information including products.
+
+        With refresh=True the response cache is bypassed (though still
+        updated), for callers that know the cached copy is stale.
+        """
         url = f"{self.COMPANY_ENDPOINT}/{company_id}.json"
+
+        if not refresh:
+            with self._cache_lock:
+                cached = self._cache.get(url)
+            if cached is not None:
+                fetched_at, company = cached
+                if time.time() - fetched_at < self.CACHE_TTL:
+                    return company
+
         try:
-            time.sleep(self.delay)  # Rate limiting
+            if self.limiter is not None:
+                self.limiter.acquire()  # Rate limiting
             response = self.session.get(url, timeout=30)
             response.raise_for_status()
-            data = response.json()
-            return data.get('company')
-        except requests.RequestException as e:
+            data = _json_loads(response.content)
+            company = data.get('company')
+            # Only cache real payloads; caching a response with no
+            # company key would suppress retries for the whole TTL
+            if company is not None:
+                with self._cache_lock:
+                    self._cache[url] = (time.time(), company)
+            return company
+        except (requests.RequestException, _JSONDecodeError) as e:
             logger.warning(f"Failed to fetch company {company_id}: {e}")
             return None
 
 class BarnivoreDB:
     """Handle SQLite database operations"""
-    
+
+    _COMPANY_COLUMNS = (
+        'id', 'address', 'checkedby', 'city', 'companyemail', 'companyname',
+        'country', 'createdon', 'doubledby', 'editor', 'email', 'fax',
+        'notes', 'phone', 'postal', 'redyellowgreen', 'region', 'state',
+        'status', 'updatedon', 'url'
+    )
+
+    # API field supplying each column of _COMPANY_COLUMNS, same order
+    _COMPANY_API_FIELDS = (
+        'id', 'address', 'checked_by', 'city', 'company_email',
+        'company_name', 'country', 'created_on', 'doubled_by', 'editor',
+        'email', 'fax', 'notes', 'phone', 'postal', 'red_yellow_green',
+        'region', 'state', 'status', 'updated_on', 'url'
+    )
+
+    _PRODUCT_COLUMNS = (
+        'id', 'boozetype', 'companyid', 'productname', 'redyellowgreen'
+    )
+
+    # SQL hoisted to constants so every execute passes the same string
+    # object and hits sqlite3's prepared-statement cache; positional '?'
+    # binding is also cheaper than named-dict binding. Upserts update the
+    # existing row in place (INSERT OR REPLACE deletes and re-inserts,
+    # churning pages and indexes) and COALESCE keeps an already-stored
+    # value when the incoming record lacks that field.
+    _SQL_INSERT_COMPANY = (
+        "INSERT INTO company ({cols}) VALUES ({vals}) "
+        "ON CONFLICT (id) DO UPDATE SET {sets}"
+    ).format(
+        cols=', '.join(_COMPANY_COLUMNS),
+        vals=', '.join('?' * len(_COMPANY_COLUMNS)),
+        sets=', '.join(f"{c} = COALESCE(excluded.{c}, {c})"
+                       for c in _COMPANY_COLUMNS[1:])
+    )
+
+    _SQL_INSERT_PRODUCT = (
+        "INSERT INTO product ({cols}) VALUES ({vals}) "
+        "ON CONFLICT (id) DO UPDATE SET {sets}"
+    ).format(
+        cols=', '.join(_PRODUCT_COLUMNS),
+        vals=', '.join('?' * len(_PRODUCT_COLUMNS)),
+        sets=', '.join(f"{c} = COALESCE(excluded.{c}, {c})"
+                       for c in _PRODUCT_COLUMNS[1:])
+    )
+
+    _SQL_INSERT_STATS = """
+        INSERT INTO stats (id, addressstring, datestring)
+        VALUES (?, ?, ?)
+    """
+
     def __init__(self, db_path: str = "barnivore.db"):
         self.db_path = db_path
+        # Single persistent connection reused by every method; reconnecting
+        # per call pays file-open and pager-init costs on each insert.
+        # isolation_level=None leaves transaction control to us,
+        # check_same_thread=False allows use from worker threads.
+        self.conn = sqlite3.connect(db_path, isolation_level=None,
+                                    check_same_thread=False)
+        # Tune for the write-heavy scrape: WAL avoids the rollback-journal
+        # write barrier, synchronous=NORMAL skips the per-commit fsync
+        # (acceptable for a re-runnable scrape), and the remaining PRAGMAs
+        # keep temp data and hot pages in memory.
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA temp_store=MEMORY")
+        self.conn.execute("PRAGMA cache_size=-65536")
+        self.conn.execute("PRAGMA mmap_size=268435456")
         self.init_database()
-    
+
+    def begin(self):
+        """Start an explicit transaction"""
+        self.conn.execute("BEGIN")
+
+    def commit(self):
+        """Commit the current transaction, if one is open"""
+        if self.conn.in_transaction:
+            self.conn.execute("COMMIT")
+
+    def close(self):
+        """Close the database connection"""
+        self.conn.close()
+
     def init_database(self):
         """Initialize database with required tables"""
         logger.info(f"Initializing database: {self.db_path}")
-        
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            
-            # Create company table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS company (
-                    id INTEGER NOT NULL PRIMARY KEY,
-                    address VARCHAR,
-                    checkedby VARCHAR,
-                    city VARCHAR,
-                    companyemail VARCHAR,
-                    companyname VARCHAR,
-                    country VARCHAR,
-                    createdon VARCHAR,
-                    doubledby VARCHAR,
-                    editor VARCHAR,
-                    email VARCHAR,
-                    fax VARCHAR,
-                    notes VARCHAR,
-                    phone VARCHAR,
-                    postal VARCHAR,
-                    redyellowgreen VARCHAR,
-                    region VARCHAR,
-                    state VARCHAR,
-                    status VARCHAR,
-                    updatedon VARCHAR,
-                    url VARCHAR
-                )
-            """)
-            
-            # Create product table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS product (
-                    id BIGINT NOT NULL PRIMARY KEY,
-                    boozetype VARCHAR,
-                    companyid INTEGER,
-                    productname VARCHAR,
-                    redyellowgreen VARCHAR,
-                    FOREIGN KEY (companyid) REFERENCES company (id)
-                )
-            """)
-            
-            # Create stats table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS stats (
-                    id BIGINT NOT NULL PRIMARY KEY,
-                    addressstring VARCHAR,
-                    datestring VARCHAR
-                )
-            """)
-            
-            conn.commit()
+
+        cursor = self.conn.cursor()
+
+        # Create company table
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS company (
+                id INTEGER NOT NULL PRIMARY KEY,
+                address VARCHAR,
+                checkedby VARCHAR,
+                city VARCHAR,
+                companyemail VARCHAR,
+                companyname VARCHAR,
+                country VARCHAR,
+                createdon VARCHAR,
+                doubledby VARCHAR,
+                editor VARCHAR,
+                email VARCHAR,
+                fax VARCHAR,
+                notes VARCHAR,
+                phone VARCHAR,
+                postal VARCHAR,
+                redyellowgreen VARCHAR,
+                region VARCHAR,
+                state VARCHAR,
+                status VARCHAR,
+                updatedon VARCHAR,
+                url VARCHAR
+            )
+        """)
+
+        # Create product table
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS product (
+                id BIGINT NOT NULL PRIMARY KEY,
+                boozetype VARCHAR,
+                companyid INTEGER,
+                productname VARCHAR,
+                redyellowgreen VARCHAR,
+                FOREIGN KEY (companyid) REFERENCES company (id)
+            )
+        """)
+
+        # Create stats table
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS stats (
+                id BIGINT NOT NULL PRIMARY KEY,
+                addressstring VARCHAR,
+                datestring VARCHAR
+            )
+        """)
     
     def insert_company(self, company_data: Dict):
         """Insert company data into database"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            
-            # Map API fields to database columns
-            company_record = {
-                'id': company_data.get('id'),
-                'address': company_data.get('address'),
-                'checkedby': company_data.get('checked_by'),
-                'city': company_data.get('city'),
-                'companyemail': company_data.get('company_email'),
-                'companyname': company_data.get('company_name'),
-                'country': company_data.get('country'),
-                'createdon': company_data.get('created_on'),
-                'doubledby': company_data.get('doubled_by'),
-                'editor': company_data.get('editor'),
-                'email': company_data.get('email'),
-                'fax': company_data.get('fax'),
-                'notes': company_data.get('notes'),
-                'phone': company_data.get('phone'),
-                'postal': company_data.get('postal'),
-                'redyellowgreen': company_data.get('red_yellow_green'),
-                'region': company_data.get('region'),
-                'state': company_data.get('state'),
-                'status': company_data.get('status'),
-                'updatedon': company_data.get('updated_on'),
-                'url': company_data.get('url')
-            }
-            
-            # Insert or replace company
-            cursor.execute("""
-                INSERT OR REPLACE INTO company (
-                    id, address, checkedby, city, companyemail, companyname,
-                    country, createdon, doubledby, editor, email, fax, notes,
-                    phone, postal, redyellowgreen, region, state, status,
-                    updatedon, url
-                ) VALUES (
-                    :id, :address, :checkedby, :city, :companyemail, :companyname,
-                    :country, :createdon, :doubledby, :editor, :email, :fax, :notes,
-                    :phone, :postal, :redyellowgreen, :region, :state, :status,
-                    :updatedon, :url
-                )
-            """, company_record)
-            
-            conn.commit()
+        # Map API fields to database columns in one pass over the fixed
+        # field list; no intermediate record dict
+        company_record = tuple(company_data.get(k)
+                               for k in self._COMPANY_API_FIELDS)
+
+        self.conn.execute(self._SQL_INSERT_COMPANY, company_record)
     
     def insert_products(self, company_id: int, products: List[Dict]):
         """Insert products for a company"""
         if not products:
             return
             
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            
-            for product in products:
-                product_record = {
-                    'id': product.get('id'),
-                    'boozetype': product.get('booze_type'),
-                    'companyid': company_id,
-                    'productname': product.get('product_name'),
-                    'redyellowgreen': product.get('red_yellow_green')
-                }
-                
-                cursor.execute("""
-                    INSERT OR REPLACE INTO product (
-                        id, boozetype, companyid, productname, redyellowgreen
-                    ) VALUES (
-                        :id, :boozetype, :companyid, :productname, :redyellowgreen
-                    )
-                """, product_record)
-            
-            conn.commit()
+        # Build all rows up front and insert them in a single batch so the
+        # whole company commits as one transaction instead of one per product
+        rows = [
+            (
+                product.get('id'),
+                product.get('booze_type'),
+                company_id,
+                product.get('product_name'),
+                product.get('red_yellow_green')
+            )
+            for product in products
+        ]
+
+        self.conn.executemany(self._SQL_INSERT_PRODUCT, rows)
     
     def insert_stats(self, address_string: str = None):
         """Insert statistics record"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            
-            stats_record = {
-                'id': int(time.time()),  # Use timestamp as ID
-                'addressstring': address_string or f"Data scraped at {datetime.now().isoformat()}",
-                'datestring': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            }
-            
-            cursor.execute("""
-                INSERT INTO stats (id, addressstring, datestring)
-                VALUES (:id, :addressstring, :datestring)
-            """, stats_record)
-            
-            conn.commit()
-    
+        now = datetime.now()
+        stats_record = (
+            int(now.timestamp()),  # Use timestamp as ID
+            address_string or f"Data scraped at {now.isoformat()}",
+            now.strftime('%Y-%m-%d %H:%M:%S')
+        )
+
+        self.conn.execute(self._SQL_INSERT_STATS, stats_record)
+
+    def create_indexes(self):
+        """Create query indexes; deferred until after the bulk load so
+        inserts run index-free"""
+        self.conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_product_companyid
+            ON product (companyid)
+        """)
+
+    def get_company_updates(self) -> Dict:
+        """Map company id to the stored updatedon timestamp"""
+        return dict(self.conn.execute("SELECT id, updatedon FROM company"))
+
     def get_stats(self) -> Dict:
         """Get database statistics"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            
-            cursor.execute("SELECT COUNT(*) FROM company")
-            company_count = cursor.fetchone()[0]
-            
-            cursor.execute("SELECT COUNT(*) FROM product")
-            product_count = cursor.fetchone()[0]
-            
-            return {
-                'companies': company_count,
-                'products': product_count
-            }
+        company_count, product_count = self.conn.execute("""
+            SELECT (SELECT COUNT(*) FROM company),
+                   (SELECT COUNT(*) FROM product)
+        """).fetchone()
+
+        return {
+            'companies': company_count,
+            'products': product_count
+        }
 
 class BarnivoreScraper:
     """Main scraper class"""
-    
+
+    # How many companies to ingest per transaction
+    COMMIT_EVERY = 200
+    # Concurrent detail fetches; the scrape is network-latency-bound
+    MAX_WORKERS = 16
+    # Companies submitted to the pool at a time, bounding how many fetched
+    # responses can pile up ahead of the DB writer
+    FETCH_CHUNK = 500
+
     def __init__(self, db_path: str = "barnivore.db", delay: float = 1.0):
         self.api = BarnivoreAPI(delay=delay)
         self.db = BarnivoreDB(db_path)
-    
+
+    def _fetch_details(self, company_id: int,
+                       refresh: bool = False) -> Optional[Dict]:
+        """get_company_details wrapper for the pool workers: anything a
+        fetch raises would otherwise surface while advancing the results
+        generator, outside the per-company try, and abort the run"""
+        try:
+            return self.api.get_company_details(company_id, refresh=refresh)
+        except Exception as e:
+            logger.error(f"Failed to fetch company {company_id}: {e}")
+            return None
+
     def scrape_all(self):
         """Scrape all company and product data"""
         logger.info("Starting Barnivore data scrape...")
@@ -263,47 +426,97 @@ class BarnivoreScraper:
         try:
             # Get list of companies
             companies = self.api.get_companies_list()
-            
+
+            # Skip companies whose summary updated_on matches the stored
+            # row: an incremental re-run then only fetches what changed
+            existing = self.db.get_company_updates()
+            to_fetch = []
+            refresh = []
+            for c in companies:
+                if (c.get('updated_on') is not None
+                        and existing.get(c.get('id')) == c.get('updated_on')):
+                    continue
+                to_fetch.append(c)
+                # A company we already store but whose updated_on no longer
+                # matches has changed: bypass the response cache, which
+                # would otherwise serve the stale detail until its TTL
+                refresh.append(c.get('id') in existing)
+            if len(to_fetch) < len(companies):
+                logger.info(f"Skipping {len(companies) - len(to_fetch)} "
+                            f"unchanged companies")
+            companies = to_fetch
+
             total_companies = len(companies)
             processed = 0
             failed = 0
+            product_count = 0
+
+            # One open transaction across the ingest, committed every
+            # COMMIT_EVERY companies: thousands of inserts share a handful
+            # of commits instead of paying one each.
+            self.db.begin()
+
+            # Fetch details concurrently (the scrape is latency-bound) while
+            # this thread stays the single SQLite writer: executor.map yields
+            # results in submission order, so inserts happen here as each
+            # fetch completes.
+            with ThreadPoolExecutor(max_workers=self.MAX_WORKERS) as executor:
+                details = (
+                    detail
+                    for start in range(0, total_companies, self.FETCH_CHUNK)
+                    for detail in executor.map(
+                        self._fetch_details,
+                        [c.get('id') for c in companies[start:start + self.FETCH_CHUNK]],
+                        refresh[start:start + self.FETCH_CHUNK])
+                )
+
+                for i, (company, detailed_company) in enumerate(zip(companies, details), 1):
+                    company_id = company.get('id')
+                    company_name = company.get('company_name', 'Unknown')
+
+                    logger.info(f"Processing {i}/{total_companies}: {company_name} (ID: {company_id})")
+
+                    try:
+                        if detailed_company:
+                            # Insert the detailed record once
+                            self.db.insert_company(detailed_company)
+
+                            # Insert products
+                            products = detailed_company.get('products', [])
+                            if products:
+                                self.db.insert_products(company_id, products)
+                                product_count += len(products)
+                                logger.info(f"  Added {len(products)} products")
+                        else:
+                            # Fetch failed: fall back to the summary listing
+                            # minus updated_on, so the stored value (or NULL)
+                            # keeps this company eligible for a refetch next
+                            # run instead of looking up to date
+                            fallback = dict(company)
+                            fallback.pop('updated_on', None)
+                            self.db.insert_company(fallback)
+
+                        processed += 1
+
+                    except Exception as e:
+                        logger.error(f"Failed to process company {company_id}: {e}")
+                        failed += 1
+
+                    # Periodic checkpoint so a crash loses at most one batch
+                    if i % self.COMMIT_EVERY == 0:
+                        self.db.commit()
+                        self.db.begin()
+
+                    # Progress update every 50 companies, from counters kept
+                    # in-process rather than COUNT(*) scans that grow with
+                    # the tables
+                    if i % 50 == 0:
+                        logger.info(f"Progress: {i}/{total_companies} companies, "
+                                  f"{processed} processed, {product_count} products")
             
-            # Process each company
-            for i, company in enumerate(companies, 1):
-                company_id = company.get('id')
-                company_name = company.get('company_name', 'Unknown')
-                
-                logger.info(f"Processing {i}/{total_companies}: {company_name} (ID: {company_id})")
-                
-                try:
-                    # Insert basic company info
-                    self.db.insert_company(company)
-                    
-                    # Get detailed company info with products
-                    detailed_company = self.api.get_company_details(company_id)
-                    
-                    if detailed_company:
-                        # Update with detailed info
-                        self.db.insert_company(detailed_company)
-                        
-                        # Insert products
-                        products = detailed_company.get('products', [])
-                        if products:
-                            self.db.insert_products(company_id, products)
-                            logger.info(f"  Added {len(products)} products")
-                    
-                    processed += 1
-                    
-                except Exception as e:
-                    logger.error(f"Failed to process company {company_id}: {e}")
-                    failed += 1
-                
-                # Progress update every 50 companies
-                if i % 50 == 0:
-                    stats = self.db.get_stats()
-                    logger.info(f"Progress: {i}/{total_companies} companies, "
-                              f"{stats['companies']} in DB, {stats['products']} products")
-            
+            # Build query indexes now that the bulk load is done
+            self.db.create_indexes()
+
             # Insert final stats
             self.db.insert_stats(f"Scraped {processed} companies, {failed} failed")
             
@@ -318,6 +531,10 @@ class BarnivoreScraper:
         except Exception as e:
             logger.error(f"Scraping failed: {e}")
             raise
+        finally:
+            self.api.close()
+            self.db.commit()
+            self.db.close()
 
 def main():
     """Main function"""